@@ -0,0 +1,99 @@
+"""
+Benchmarks FastWordCloud against the stock WordCloud.generate_from_frequencies at 50 and 500
+words, using the same settings as wordcloud_from_city, plus a warm-started re-render after
+the frequencies have drifted slightly. Like the app, every run builds a new instance.
+FastWordCloud is timed both with its shared font and glyph caches emptied before each run
+(cold, as on the first render) and with them already filled (cached, as on later renders).
+"""
+
+from random import Random
+import time
+from wordcloud import WordCloud
+import wordcloud_layout
+from wordcloud_layout import FastWordCloud
+
+repeats = 5
+
+
+def make_frequencies(num_words, seed=0):
+    """
+    Builds a Zipf-like frequency table of made up words
+    :param num_words: The number of words in the table
+    :param seed: Seed for the random word generator
+    :return: a dictionary of words and frequencies
+    """
+    random_state = Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    frequencies = {}
+    while len(frequencies) < num_words:
+        word = ''.join(random_state.choice(letters) for _ in range(random_state.randint(3, 10)))
+        frequencies[word] = 1000 / (len(frequencies) + 1)
+    return frequencies
+
+
+def drift(frequencies, seed=1):
+    """
+    Nudges every frequency by up to 5%
+    :param frequencies: a dictionary of words and frequencies
+    :param seed: Seed for the random drift
+    :return: a new dictionary of words and frequencies
+    """
+    random_state = Random(seed)
+    return {word: freq * random_state.uniform(0.95, 1.05) for word, freq in frequencies.items()}
+
+
+def clear_caches():
+    """
+    Empties the fonts and glyphs FastWordCloud shares between instances
+    :return: None
+    """
+    wordcloud_layout._fonts.clear()
+    wordcloud_layout._glyphs.clear()
+
+
+def best_time(make_wc, frequencies, cold=False):
+    """
+    Times generate_from_frequencies on a new instance each run, keeping the best of a few runs
+    :param make_wc: A function that builds the WordCloud to time
+    :param frequencies: a dictionary of words and frequencies
+    :param cold: If True, empty the shared caches before each run
+    :return: the best time in seconds, and the last WordCloud
+    """
+    times = []
+    for _ in range(repeats):
+        if cold:
+            clear_caches()
+        wc = make_wc()
+        start = time.perf_counter()
+        wc.generate_from_frequencies(frequencies)
+        times.append(time.perf_counter() - start)
+    return min(times), wc
+
+
+def main():
+    settings = dict(background_color="white", max_font_size=40, scale=3, random_state=0)
+    print(f"{'words':>6} {'stock':>10} {'cold':>10} {'cached':>10} {'warm':>10} {'placed':>14} {'kept':>8}")
+    for num_words in (50, 500):
+        frequencies = make_frequencies(num_words)
+        stock_time, stock = best_time(lambda: WordCloud(max_words=num_words, **settings), frequencies)
+        cold_time, fast = best_time(lambda: FastWordCloud(max_words=num_words, **settings), frequencies,
+                                    cold=True)
+        cached_time, fast = best_time(lambda: FastWordCloud(max_words=num_words, **settings), frequencies)
+
+        warm = FastWordCloud(max_words=num_words, warm_start=True, **settings)
+        warm_times = []
+        for i in range(repeats):
+            warm.generate_from_frequencies(frequencies)
+            before = {word: position for (word, _), _, position, _, _ in warm.layout_}
+            start = time.perf_counter()
+            warm.generate_from_frequencies(drift(frequencies, seed=i))
+            warm_times.append(time.perf_counter() - start)
+        # how many words of the last drifted render stayed where they were
+        kept = sum(before.get(word) == position for (word, _), _, position, _, _ in warm.layout_)
+
+        placed = f"{len(stock.layout_)}/{len(fast.layout_)}/{len(warm.layout_)}"
+        print(f"{num_words:>6} {stock_time * 1000:>8.1f}ms {cold_time * 1000:>8.1f}ms {cached_time * 1000:>8.1f}ms "
+              f"{min(warm_times) * 1000:>8.1f}ms {placed:>14} {kept:>4}/{len(before):<3}")
+
+
+main()
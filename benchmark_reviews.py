@@ -0,0 +1,109 @@
+"""
+Benchmarks review extraction on saved /biz/ pages: the full html.parser soup that get_reviews
+used to build against review_extractor.extract_reviews, reporting parse time and peak memory
+per page. The extractor is run with html.parser, and with lxml too when it is installed.
+Peak memory is what tracemalloc sees, which leaves out lxml's own allocations, so only the
+html.parser rows compare like for like.
+Usage: python benchmark_reviews.py saved_page.html [more_pages.html ...]
+Without any pages, a synthetic page with 20 microdata reviews and a lot of filler is used.
+"""
+
+import sys
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+import review_extractor
+from review_extractor import extract_reviews
+
+repeats = 5
+
+
+def full_soup_reviews(html):
+    """
+    Extracts the review text the way get_reviews originally did
+    :param html: The HTML of a Yelp /biz/ page
+    :return: a list of review texts
+    """
+    review_text = []
+    soup = BeautifulSoup(html, 'html.parser')
+    for p in soup.find_all('p'):
+        if 'itemprop' in p.attrs:
+            if p.attrs['itemprop'] == 'description':
+                review_text.append(p.get_text().strip())
+    return review_text
+
+
+def synthetic_page(num_reviews=20, filler=3000):
+    """
+    Builds a page shaped like a /biz/ page: a few reviews buried in a lot of other markup
+    :param num_reviews: The number of reviews on the page
+    :param filler: The number of unrelated elements on the page
+    :return: the HTML as bytes
+    """
+    parts = ['<html><head><title>Restaurant</title></head><body>']
+    for i in range(filler):
+        parts.append(f'<div class="filler-{i}"><span>Photo {i}</span><a href="/biz_photos/{i}">more</a></div>')
+    for i in range(num_reviews):
+        parts.append(f'<div itemprop="review" itemscope itemtype="http://schema.org/Review">'
+                     f'<meta itemprop="author" content="Reviewer {i}">'
+                     f'<div itemprop="reviewRating"><meta itemprop="ratingValue" content="{i % 5 + 1}.0"></div>'
+                     f'<meta itemprop="datePublished" content="2019-03-{i % 28 + 1:02d}">'
+                     f'<p itemprop="description">Review number {i} about the noodles and dumplings.</p></div>')
+    parts.append('</body></html>')
+    return ''.join(parts).encode()
+
+
+def measure(extract, html):
+    """
+    Measures an extractor on one page
+    :param extract: The function to measure
+    :param html: The HTML of the page
+    :return: best time in seconds, peak memory in bytes and the number of reviews found
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        extract(html)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    found = extract(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak, len(found)
+
+
+def available_parsers():
+    """
+    Lists the parsers extract_reviews can be benchmarked with
+    :return: a list of BeautifulSoup parser names
+    """
+    parsers = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        pass
+    return parsers
+
+
+def main():
+    pages = {}
+    for path in sys.argv[1:]:
+        with open(path, 'rb') as f:
+            pages[path] = f.read()
+    if not pages:
+        pages['synthetic'] = synthetic_page()
+
+    runs = [('full soup', 'html.parser', full_soup_reviews)]
+    runs += [('extractor', parser, extract_reviews) for parser in available_parsers()]
+
+    print(f"{'page':<30} {'extractor':<12} {'parser':<12} {'time':>10} {'peak memory':>12} {'reviews':>8}")
+    for path, html in pages.items():
+        for label, parser, extract in runs:
+            review_extractor.parser = parser
+            best, peak, found = measure(extract, html)
+            print(f"{path[-30:]:<30} {label:<12} {parser:<12} {best * 1000:>8.1f}ms {peak / 1024:>10.0f}KB "
+                  f"{found:>8}")
+
+
+main()
@@ -0,0 +1,178 @@
+"""
+Finds the words that set each restaurant's reviews apart from the rest of the location's.
+The reviews are turned into a sparse restaurant x term count matrix once, weighted with
+TF-IDF so that words every restaurant's reviews use get a weight of 0 and drop out without
+hand-written stopword lists, and saved as .npy files that later queries memory-map instead of
+recomputing.
+"""
+
+from dataclasses import dataclass
+import errno
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+from scipy.sparse import csr_matrix
+from wordcloud import WordCloud, STOPWORDS
+
+
+@dataclass
+class TermMatrix:
+    restaurants: list
+    terms: list
+    counts: csr_matrix
+    weights: csr_matrix
+
+
+def build_term_matrix(review_dict, stopwords=None):
+    """
+    Counts the words in each restaurant's reviews and weights them with TF-IDF
+    :param review_dict: A dictionary of restaurants and their reviews
+    :param stopwords: Words to leave out, defaults to the WordCloud library's stopwords
+    :return: a TermMatrix with one row per restaurant
+    """
+    if stopwords is None:
+        stopwords = set(STOPWORDS)
+    tokenizer = WordCloud(stopwords=stopwords)
+
+    restaurants = list(review_dict)
+    rows, words, counts = [], [], []
+    for row, restaurant in enumerate(restaurants):
+        # lower cased, so that a word is one column whichever way each restaurant's reviews
+        # mostly capitalize it
+        word_counts = tokenizer.process_text('\n'.join(review_dict[restaurant]).lower())
+        rows.extend([row] * len(word_counts))
+        words.extend(word_counts.keys())
+        counts.extend(word_counts.values())
+
+    terms, columns = np.unique(np.array(words, dtype=str), return_inverse=True)
+    counts = csr_matrix((np.array(counts, dtype=np.float32), (np.array(rows, dtype=np.int32), columns)),
+                        shape=(len(restaurants), len(terms)))
+    counts.sort_indices()
+    return TermMatrix(restaurants, terms.tolist(), counts, tfidf(counts))
+
+
+def tfidf(counts):
+    """
+    Weights a count matrix with sublinear TF-IDF: log(1 + count) * log(n / df). A word that
+    every restaurant's reviews use gets a weight of 0, so with a single restaurant every weight
+    is 0.
+    :param counts: A sparse restaurant x term count matrix
+    :return: a sparse matrix of weights with the same sparsity pattern as counts
+    """
+    num_restaurants = counts.shape[0]
+    document_frequency = np.bincount(counts.indices, minlength=counts.shape[1])
+    idf = np.log(num_restaurants / np.maximum(document_frequency, 1))
+    weights = csr_matrix((np.log1p(counts.data) * idf[counts.indices].astype(np.float32),
+                          counts.indices, counts.indptr), shape=counts.shape)
+    return weights
+
+
+def distinctive_frequencies(term_matrix, restaurant, max_words=50):
+    """
+    Gets a restaurant's most distinctive words, ready for WordCloud.generate_from_frequencies
+    :param term_matrix: A TermMatrix
+    :param restaurant: The name of the restaurant
+    :param max_words: The number of words to return
+    :return: a dictionary of words and their TF-IDF weights
+    """
+    row = term_matrix.restaurants.index(restaurant)
+    start, end = term_matrix.weights.indptr[row], term_matrix.weights.indptr[row + 1]
+    data = term_matrix.weights.data[start:end]
+    indices = term_matrix.weights.indices[start:end]
+    top = np.argsort(data, kind='stable')[::-1][:max_words]
+    return {term_matrix.terms[indices[i]]: float(data[i]) for i in top if data[i] > 0}
+
+
+def save_term_matrix(directory, term_matrix):
+    """
+    Saves a TermMatrix as .npy arrays that load_term_matrix can memory-map. The counts and
+    weights share the indices and indptr arrays. Everything is written to a new sibling
+    directory that then replaces the old one, so files another thread has memory-mapped are
+    never truncated.
+    :param directory: The directory to save to
+    :param term_matrix: The TermMatrix to save
+    :return: None
+    """
+    directory = directory.rstrip(os.sep)
+    parent = os.path.dirname(directory)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    version = uuid.uuid4().hex
+    new_directory = f'{directory}.{version}.tmp'
+    os.makedirs(new_directory)
+    np.save(os.path.join(new_directory, 'counts.npy'), term_matrix.counts.data)
+    np.save(os.path.join(new_directory, 'weights.npy'), term_matrix.weights.data)
+    np.save(os.path.join(new_directory, 'indices.npy'), term_matrix.counts.indices)
+    np.save(os.path.join(new_directory, 'indptr.npy'), term_matrix.counts.indptr)
+    with open(os.path.join(new_directory, 'labels.json'), 'w') as f:
+        json.dump({'version': version, 'restaurants': term_matrix.restaurants, 'terms': term_matrix.terms}, f)
+
+    # a directory can only be renamed over an empty one, so move the old one aside first, and
+    # again if another save moved its own directory in between
+    while True:
+        old_directory = f'{directory}.{uuid.uuid4().hex}.old'
+        try:
+            os.replace(directory, old_directory)
+        except FileNotFoundError:
+            old_directory = None
+        try:
+            os.replace(new_directory, directory)
+            moved = True
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                # put the previous save back rather than leave nothing behind
+                if old_directory is not None:
+                    try:
+                        os.replace(old_directory, directory)
+                    except OSError:
+                        pass
+                shutil.rmtree(new_directory, ignore_errors=True)
+                raise
+            moved = False
+        if old_directory is not None:
+            # removing files doesn't invalidate memory maps of them
+            shutil.rmtree(old_directory, ignore_errors=True)
+        if moved:
+            return
+
+
+def load_term_matrix(directory, retries=3):
+    """
+    Loads a TermMatrix saved by save_term_matrix, memory-mapping its arrays
+    :param directory: The directory it was saved to
+    :param retries: How many times to start over if the matrix is replaced while loading
+    :return: the TermMatrix, or None if there isn't one saved there
+    """
+    for attempt in range(retries):
+        if attempt > 0:
+            time.sleep(0.01)
+        try:
+            term_matrix, version = _load_term_matrix(directory)
+            if version == _read_labels(directory)['version']:
+                return term_matrix
+        except (FileNotFoundError, ValueError):
+            # missing between save_term_matrix moving the old directory aside and the new one
+            # in, or labels and arrays from different saves that don't fit together
+            continue
+    return None
+
+
+def _read_labels(directory):
+    with open(os.path.join(directory, 'labels.json')) as f:
+        return json.load(f)
+
+
+def _load_term_matrix(directory):
+    labels = _read_labels(directory)
+
+    def load(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r')
+
+    shape = (len(labels['restaurants']), len(labels['terms']))
+    indices, indptr = load('indices'), load('indptr')
+    counts = csr_matrix((load('counts'), indices, indptr), shape=shape, copy=False)
+    weights = csr_matrix((load('weights'), indices, indptr), shape=shape, copy=False)
+    return TermMatrix(labels['restaurants'], labels['terms'], counts, weights), labels['version']
@@ -6,14 +6,25 @@ using the WordCloud library.
 Derived from work done by Dr. Tirthajyoti Sarkar.
 """
 
-from flask import Flask, render_template, request, flash, redirect, url_for, send_file, Response
+from flask import Flask, render_template, request, flash, redirect, url_for, send_file, Response, abort
 import matplotlib.pyplot as plt
 import urllib.request, urllib.parse, urllib.error
 from bs4 import BeautifulSoup
 from dataclasses import dataclass
 import ssl
 from wordcloud import WordCloud, STOPWORDS
+from wordcloud_layout import FastWordCloud
+from review_extractor import extract_reviews
+from single_flight import SingleFlight
+from distinctive_words import build_term_matrix, distinctive_frequencies, save_term_matrix, load_term_matrix
+from dataclasses import asdict
 import io
+import base64
+import json
+import threading
+from collections import OrderedDict
+import os
+import re
 from io import BytesIO
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -33,10 +44,21 @@ class Restaurant:
 
 
 app = Flask(__name__)
+# Stream the reviews and the city wordcloud to the page as they are ready
+app.config['STREAM_RESULTS'] = True
 default_url = 'https://www.yelp.com/search?find_desc=Restaurants&find_loc='
 ctx = ssl.create_default_context()
 ctx.check_hostname = False
 ctx.verify_mode = ssl.CERT_NONE
+# The last wordcloud layout for each crawl, keyed by crawl_key, so re-rendering a city starts
+# from it. Only the most recently used max_city_layouts are kept.
+city_layouts = OrderedDict()
+city_layouts_lock = threading.Lock()
+max_city_layouts = 100
+# Concurrent requests for the same location and number of restaurants share one crawl
+crawls = SingleFlight()
+# Where the restaurant x term matrix of each crawl is saved
+term_matrix_dir = 'term_matrices'
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -51,9 +73,11 @@ def index():
             location = request.form['location']
             city, city_string = request_city(location)
             num_reviews = request.form['num_reviews']
-            html = read_page(city)
-            restaurant_names, restaurant_links, reviews, reviews_to_display = soup_parser(html, int(num_reviews))
-            wordcloud_from_city(reviews, place=city_string, num_restaurant=20)
+            if app.config['STREAM_RESULTS']:
+                stream_url = url_for('stream', location=location, num_reviews=num_reviews)
+                return render_template('yelp_wordcloud.html', reviews={}, stream_url=stream_url)
+            restaurant_names, restaurant_links, reviews, reviews_to_display = crawls.do(
+                crawl_key(city, num_reviews), crawl_city, city, city_string, int(num_reviews))
             wordcloud_reviews(reviews)
             print(reviews_to_display)
             return render_template('yelp_wordcloud.html', reviews=reviews_to_display)
@@ -64,6 +88,158 @@ def index():
     return render_template('yelp_wordcloud.html', reviews=reviews)
 
 
+@app.route('/stream')
+def stream():
+    """
+    Streams the reviews for a location to the page as server-sent events, one restaurant at
+    a time as soon as its page has been parsed, followed by the wordcloud for the location.
+    :return: a text/event-stream Response
+    """
+    location = request.args.get('location', '')
+    num_reviews = request.args.get('num_reviews', '0')
+    city, city_string = request_city(location)
+    events = crawls.stream(('stream',) + crawl_key(city, num_reviews), stream_city, location, num_reviews)
+    return Response(events, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/distinctive.png')
+def distinctive_wordcloud():
+    """
+    Renders a wordcloud of the words that set a restaurant's reviews apart from the rest of the
+    location's, from the term matrix saved when the location was crawled
+    :return: the wordcloud as a PNG
+    """
+    location = request.args.get('location', '')
+    num_reviews = request.args.get('num_reviews', '0')
+    restaurant = request.args.get('restaurant', '')
+    city, city_string = request_city(location)
+    term_matrix = load_term_matrix(term_matrix_directory(city, num_reviews))
+    if term_matrix is None or restaurant not in term_matrix.restaurants:
+        abort(404)
+    frequencies = distinctive_frequencies(term_matrix, restaurant)
+    if not frequencies:
+        abort(404)
+
+    wc = FastWordCloud(background_color="white", max_words=50, max_font_size=40)
+    wc.generate_from_frequencies(frequencies)
+    img = BytesIO()
+    wc.to_image().save(img, 'PNG')
+    img.seek(0)
+    return send_file(img, mimetype='image/png')
+
+
+def term_matrix_directory(city, num_reviews):
+    """
+    Gets the directory the term matrix of a crawl is saved in
+    :param city: The [city, state] list from request_city
+    :param num_reviews: the number of restaurants the crawl gathered reviews on
+    :return: the directory path
+    """
+    location, num_reviews = crawl_key(city, num_reviews)
+    name = re.sub(r'[^a-z0-9]+', '-', ' '.join(location + (num_reviews,))).strip('-')
+    return os.path.join(term_matrix_dir, name)
+
+
+def crawl_key(city, num_reviews):
+    """
+    Builds the key that concurrent crawls of the same location are coalesced on
+    :param city: The [city, state] list from request_city
+    :param num_reviews: the number of restaurants to gather reviews on
+    :return: a tuple of the lower cased city and state, and the number of restaurants
+    """
+    return tuple(part.lower() for part in city), str(num_reviews).strip()
+
+
+def crawl_city(city, city_string, num_reviews):
+    """
+    Gathers the reviews for a location and renders its wordcloud
+    :param city: The [city, state] list from request_city
+    :param city_string: the original string input by the user
+    :param num_reviews: the number of restaurants to gather reviews on. If 0, default to all
+    :return: the restaurant names, restaurant links, reviews and reviews to display, as
+        returned by soup_parser
+    """
+    html = read_page(city)
+    restaurant_names, restaurant_links, reviews, reviews_to_display = soup_parser(html, num_reviews)
+    wordcloud_from_city(reviews, place=city_string, num_restaurant=20, layout_key=crawl_key(city, num_reviews))
+    save_term_matrix(term_matrix_directory(city, num_reviews), build_term_matrix(reviews))
+    return restaurant_names, restaurant_links, reviews, reviews_to_display
+
+
+def stream_city(location, num_reviews):
+    """
+    Crawls a location, yielding server-sent events as the results come in:
+        reviews: {"name": restaurant name, "reviews": list of review texts,
+                  "records": list of {"text", "rating", "date", "author"}}, once per restaurant
+        preview: {"place": location, "image": PNG data url of a low resolution wordcloud}
+        cloud: {"place": location, "image": PNG data url of the full resolution wordcloud}
+        distinctive: {restaurant name: url of its distinctive words wordcloud}
+        failed: {"message": what went wrong}
+        done: {} when there is nothing left to send
+    :param location: The "city, state" string input by the user
+    :param num_reviews: the number of restaurants to gather reviews on. If 0, default to all
+    :return: a generator of server-sent event strings
+    """
+    try:
+        city, city_string = request_city(location)
+        directory = term_matrix_directory(city, num_reviews)
+        layout_key = crawl_key(city, num_reviews)
+        query = {'location': location, 'num_reviews': num_reviews}
+        html = read_page(city)
+        soup = BeautifulSoup(html, 'html.parser')
+        restaurant_links = ['https://yelp.com' + link for link in get_restaurant_links(soup)]
+        restaurant_names = get_restaurant_names(soup)
+        num_reviews = int(num_reviews)
+        if num_reviews == 0:
+            num_reviews = len(restaurant_links)
+
+        reviews = {}
+        for name, records in iter_reviews(restaurant_links, restaurant_names, num_reviews):
+            reviews[name] = [record.text for record in records]
+            yield server_sent_event('reviews', {'name': name, 'reviews': reviews[name],
+                                                'records': [asdict(record) for record in records]})
+
+        frequencies = city_frequencies(reviews)
+        preview = preview_wordcloud(frequencies)
+        yield server_sent_event('preview', {'place': city_string, 'image': png_data_url(preview)})
+        wc = city_wordcloud(frequencies, layout_key=layout_key)
+        yield server_sent_event('cloud', {'place': city_string, 'image': png_data_url(wc)})
+
+        term_matrix = build_term_matrix(reviews)
+        save_term_matrix(directory, term_matrix)
+        # words every restaurant's reviews use don't count, so e.g. a lone restaurant has none
+        yield server_sent_event('distinctive', {
+            name: '/distinctive.png?' + urllib.parse.urlencode(dict(query, restaurant=name))
+            for name in reviews if distinctive_frequencies(term_matrix, name, max_words=1)})
+    except Exception as e:
+        print("Streaming failed:", e)
+        yield server_sent_event('failed', {'message': "Could not gather reviews for that location. "
+                                                      "Please try again."})
+    yield server_sent_event('done', {})
+
+
+def server_sent_event(event, data):
+    """
+    Formats a server-sent event
+    :param event: The name of the event
+    :param data: JSON serializable data for the event
+    :return: the event as a string
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def png_data_url(wc):
+    """
+    Encodes a wordcloud as a PNG data url that can be used as an image's src
+    :param wc: a generated WordCloud
+    :return: the data url string
+    """
+    img = BytesIO()
+    wc.to_image().save(img, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(img.getvalue()).decode('ascii')
+
+
 def request_city(city_string):
     """
     Asks the user for a city and state to use as input.
@@ -149,27 +325,31 @@ def get_reviews(restaurant_links, restaurant_names, num_reviews):
 
     reviews = {}
     reviews_to_display = {}
+    for name, records in iter_reviews(restaurant_links, restaurant_names, num_reviews):
+        reviews[name] = [record.text for record in records]
+        reviews_to_display[name] = [[record.text] for record in records]
+
+    return reviews, reviews_to_display
+
+
+def iter_reviews(restaurant_links, restaurant_names, num_reviews):
+    """
+    Gathers the reviews one restaurant at a time, yielding each restaurant's reviews as soon
+    as its page has been parsed
+    :param restaurant_links: A list of full URLs for all of the restaurants
+    :param restaurant_names: A list of Names for all of the restaurants
+    :param num_reviews A number provided by the users of the number of restaurants
+        to gather reviews on.
+    :return: a generator of (restaurant name, list of Review records) tuples
+    """
     num_reviews = min(num_reviews, len(restaurant_links), len(restaurant_names))
 
     for i in range(num_reviews):
         print(f"Gathering top reviews on {restaurant_names[i]} now...")
-        review_text = []
-        review_display = []
         url = restaurant_links[i]
         uh = urllib.request.urlopen(url, context=ctx)
         html = uh.read()
-        soup = BeautifulSoup(html, 'html.parser')
-
-        for p in soup.find_all('p'):
-            if 'itemprop' in p.attrs:
-                if p.attrs['itemprop'] == 'description':
-                    text = p.get_text().strip()
-                    review_text.append(text)
-                    review_display.append([text])
-        reviews[str(restaurant_names[i])] = review_text
-        reviews_to_display[str(restaurant_names[i])] = review_display
-
-    return reviews, reviews_to_display
+        yield str(restaurant_names[i]), extract_reviews(html)
 
 
 def print_reviews(reviews, restaurant_names):
@@ -350,7 +530,7 @@ def plot_wc(wc, place=None, restaurant=None):
 
 @app.route('/wc.png')
 def wordcloud_from_city(review_dict, place=None, num_restaurant=10, num_reviews=20, stopword_list=None,
-                        disable_default_stopwords=False, verbosity=0):
+                        disable_default_stopwords=False, verbosity=0, layout_key=None):
     """
 
     :param review_dict:
@@ -360,8 +540,28 @@ def wordcloud_from_city(review_dict, place=None, num_restaurant=10, num_reviews=
     :param stopword_list:
     :param disable_default_stopwords:
     :param verbosity:
+    :param layout_key: The crawl_key the layout is reused under, or None to start afresh
     :return:
     """
+    frequencies = city_frequencies(review_dict, stopword_list=stopword_list,
+                                   disable_default_stopwords=disable_default_stopwords)
+    wc = city_wordcloud(frequencies, layout_key=layout_key)
+
+    plot_wc(wc, place=place)
+    img = BytesIO()
+    wc.to_image().save(img, 'PNG')
+    img.seek(0)
+    return send_file(img, mimetype='image/png')
+
+
+def city_frequencies(review_dict, stopword_list=None, disable_default_stopwords=False):
+    """
+    Counts the words in all of the reviews in a location, leaving out the stopwords
+    :param review_dict: A dictionary of restaurants and their reviews
+    :param stopword_list: Extra words to leave out of the wordcloud
+    :param disable_default_stopwords: If True, only use the WordCloud library's stopwords
+    :return: a dictionary of words and their frequencies
+    """
     text = ""
 
     for restaurant in review_dict:
@@ -386,14 +586,43 @@ def wordcloud_from_city(review_dict, place=None, num_restaurant=10, num_reviews=
         for word in stopword_list:
             stopwords.add(word)
 
-    wc = WordCloud(background_color="white", max_words=50, stopwords=stopwords, max_font_size=40, scale=3)
-    _ = wc.generate(text)
+    return WordCloud(stopwords=stopwords).process_text(text)
 
-    plot_wc(wc, place=place)
-    img = BytesIO()
-    wc.to_image().save(img, 'PNG')
-    img.seek(0)
-    return send_file(img, mimetype='image/png')
+
+def city_wordcloud(frequencies, layout_key=None):
+    """
+    Builds the full resolution wordcloud for a location
+    :param frequencies: A dictionary of words and their frequencies from city_frequencies
+    :param layout_key: The crawl_key of the crawl, used to reuse its last layout. If None, the
+        layout starts afresh and is not kept.
+    :return: the generated FastWordCloud
+    """
+    wc = FastWordCloud(background_color="white", max_words=50, max_font_size=40, scale=3, warm_start=True)
+    with city_layouts_lock:
+        if layout_key in city_layouts:
+            wc.layout_ = city_layouts[layout_key]
+    _ = wc.generate_from_frequencies(frequencies)
+    if layout_key is not None:
+        with city_layouts_lock:
+            city_layouts[layout_key] = wc.layout_
+            city_layouts.move_to_end(layout_key)
+            while len(city_layouts) > max_city_layouts:
+                city_layouts.popitem(last=False)
+
+    return wc
+
+
+def preview_wordcloud(frequencies):
+    """
+    Builds a quick, low resolution wordcloud for a location, with fewer words on a small canvas,
+    to show while the full resolution one is rendered
+    :param frequencies: A dictionary of words and their frequencies from city_frequencies
+    :return: the generated FastWordCloud
+    """
+    wc = FastWordCloud(background_color="white", max_words=20, max_font_size=20, width=200, height=100)
+    _ = wc.generate_from_frequencies(frequencies)
+
+    return wc
 
 
 def main():
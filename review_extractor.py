@@ -0,0 +1,145 @@
+"""
+Pulls the reviews out of a Yelp /biz/ page without building a soup of the whole page. The
+embedded JSON-LD data is used when the page has it, otherwise only the review microdata
+elements are parsed, using a SoupStrainer (and lxml when it is installed). Each review comes
+back as a structured record with its text, rating, date and author.
+"""
+
+from dataclasses import dataclass
+import html as html_entities
+import json
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    parser = 'lxml'
+except ImportError:
+    parser = 'html.parser'
+
+json_ld_strainer = SoupStrainer('script', attrs={'type': 'application/ld+json'})
+microdata_strainer = SoupStrainer(attrs={'itemprop': ['review', 'description']})
+
+
+@dataclass
+class Review:
+    text: str
+    rating: float = None
+    date: str = None
+    author: str = None
+
+
+def extract_reviews(html):
+    """
+    Extracts the reviews from the HTML of a restaurant's page
+    :param html: The HTML of a Yelp /biz/ page, as bytes or a string
+    :return: a list of Review records, in the order they appear on the page
+    """
+    if isinstance(html, bytes):
+        has_json_ld = b'application/ld+json' in html
+    else:
+        has_json_ld = 'application/ld+json' in html
+
+    if has_json_ld:
+        reviews = reviews_from_json_ld(html)
+        if reviews:
+            return reviews
+    return reviews_from_microdata(html)
+
+
+def reviews_from_json_ld(html):
+    """
+    Reads the reviews from the page's <script type="application/ld+json"> blocks
+    :param html: The HTML of a Yelp /biz/ page
+    :return: a list of Review records, empty if the JSON-LD has no reviews
+    """
+    soup = BeautifulSoup(html, parser, parse_only=json_ld_strainer)
+    reviews = []
+    for script in soup.find_all('script'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        for item in find_json_ld_reviews(data):
+            text = item.get('description') or item.get('reviewBody')
+            if not isinstance(text, str) or not text.strip():
+                continue
+            rating = item.get('reviewRating')
+            if isinstance(rating, dict):
+                rating = rating.get('ratingValue')
+            author = item.get('author')
+            if isinstance(author, dict):
+                author = author.get('name')
+            # unlike get_text(), the JSON-LD strings still have their HTML entities in them
+            author = html_entities.unescape(author) if isinstance(author, str) else None
+            reviews.append(Review(html_entities.unescape(text).strip(), to_rating(rating),
+                                  item.get('datePublished'), author))
+    return reviews
+
+
+def find_json_ld_reviews(data):
+    """
+    Walks a JSON-LD document looking for the review objects
+    :param data: The decoded JSON-LD
+    :return: a generator of review dictionaries
+    """
+    if isinstance(data, list):
+        for item in data:
+            yield from find_json_ld_reviews(item)
+    elif isinstance(data, dict):
+        if data.get('@type') == 'Review':
+            yield data
+            return
+        for key in ('review', 'reviews', '@graph'):
+            if key in data:
+                yield from find_json_ld_reviews(data[key])
+
+
+def reviews_from_microdata(html):
+    """
+    Reads the reviews from the itemprop="review" microdata, parsing only those elements and
+    any <p itemprop="description"> outside of them
+    :param html: The HTML of a Yelp /biz/ page
+    :return: a list of Review records
+    """
+    soup = BeautifulSoup(html, parser, parse_only=microdata_strainer)
+    reviews = []
+    for tag in soup.find_all(attrs={'itemprop': ['review', 'description']}):
+        if tag.attrs['itemprop'] == 'review':
+            description = tag.find('p', attrs={'itemprop': 'description'})
+            if description is None:
+                continue
+            reviews.append(Review(description.get_text().strip(),
+                                  to_rating(itemprop_value(tag, 'ratingValue')),
+                                  itemprop_value(tag, 'datePublished'),
+                                  itemprop_value(tag, 'author')))
+        elif tag.name == 'p' and tag.find_parent(attrs={'itemprop': 'review'}) is None:
+            reviews.append(Review(tag.get_text().strip()))
+    return reviews
+
+
+def itemprop_value(tag, itemprop):
+    """
+    Gets the value of a microdata property inside a tag, from its content attribute if it has
+    one (as <meta> tags do), otherwise from its text
+    :param tag: The tag to search in
+    :param itemprop: The name of the property
+    :return: the value as a string, or None if the property is missing
+    """
+    prop = tag.find(attrs={'itemprop': itemprop})
+    if prop is None:
+        return None
+    if 'content' in prop.attrs:
+        return prop.attrs['content']
+    return prop.get_text().strip() or None
+
+
+def to_rating(value):
+    """
+    Converts a rating to a float
+    :param value: The rating as found on the page
+    :return: the rating, or None if there isn't a usable one
+    """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
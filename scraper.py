@@ -1,8 +1,66 @@
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from concurrent.futures import ThreadPoolExecutor
 import urllib.request
+import hashlib
 import csv
+import os
 
 url = 'http://www.fasttrack.co.uk/league-tables/tech-track-100/league-table/'
+output_file = 'techtrack100.csv'
+cache_dir = 'techtrack_cache'
+max_workers = 8
+header = ['Rank', 'Company Name', 'Webpage', 'Description', 'Location', 'Year end', 'Annual sales rise over 3 years', 'Sales £000s', 'Staff', 'Comments']
+
+
+def fetch(page_url):
+    """
+    Reads a page, keeping a copy in the cache directory so it is only downloaded once
+    """
+    path = os.path.join(cache_dir, hashlib.sha1(page_url.encode()).hexdigest() + '.html')
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    html = urllib.request.urlopen(page_url).read()
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        f.write(html)
+    os.replace(path + '.tmp', path)
+    return html
+
+
+def read_enriched(path):
+    """
+    Reads the webpages found by a previous run, keyed by company name
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, newline='') as f_input:
+        return {row['Company Name']: row['Webpage'] for row in csv.DictReader(f_input) if row.get('Webpage')}
+
+
+def find_webpage(company_url):
+    """
+    Gets the company's own webpage from the link in the last row of the table on its page
+    """
+    try:
+        soup = BeautifulSoup(fetch(company_url), 'html.parser', parse_only=SoupStrainer('table'))
+        tableRow = soup.find('table').find_all('tr')[-1]
+        return tableRow.find('a').get('href')
+    except Exception:
+        return None
+
+
+def enrich(row, company_url, enriched):
+    """
+    Fills in a row's webpage, reusing the one from a previous run when there is one
+    """
+    company_name = row[1]
+    if company_name in enriched:
+        row[2] = enriched[company_name]
+    else:
+        row[2] = find_webpage(company_url)
+    return row
+
 
 def main():
     page = urllib.request.urlopen(url)
@@ -12,8 +70,7 @@ def main():
     results = table.find_all('tr')
     print('Number of results', len(results))
     rows = []
-    rows.append(['Rank', 'Company Name', 'Webpage', 'Description', 'Location', 'Year end', 'Annual sales rise over 3 years', 'Sales £000s', 'Staff', 'Comments'])
-    print(rows)
+    company_urls = []
     for result in results:
         data = result.find_all('td')
         if len(data) == 0:
@@ -29,18 +86,23 @@ def main():
         company_name = data[1].find('span', attrs={'class':'company-name'}).getText()
         description = company.replace(company_name,'')
         sales = sales.strip('*').strip('†').replace(',', '')
-        company_url = data[1].find('a').get('href')
-        page = urllib.request.urlopen(company_url)
-        soup = BeautifulSoup(page, 'html.parser')
-        try:
-            tableRow = soup.find('table').find_all('tr')[-1]
-            webpage = tableRow.find('a').get('href')
-        except:
-            webpage = None
-        rows.append([rank, company_name, webpage, description, location, yearend, salesrise, sales, staff, comments])
-    print(rows)
-    with open('techtrack100.csv', 'w', newline='') as f_output:
+        company_urls.append(data[1].find('a').get('href'))
+        rows.append([rank, company_name, None, description, location, yearend, salesrise, sales, staff, comments])
+
+    # rows go to a partial file first, so an interrupted run keeps both the previous output
+    # and whatever it got through
+    partial_file = output_file + '.partial'
+    enriched = read_enriched(output_file)
+    enriched.update(read_enriched(partial_file))
+    print('Already enriched', len(enriched))
+    with open(partial_file, 'w', newline='') as f_output, ThreadPoolExecutor(max_workers) as executor:
         csv_output = csv.writer(f_output)
-        csv_output.writerows(rows)
+        csv_output.writerow(header)
+        # map hands the rows back in rank order, each as soon as it and the ones before it are done
+        for row in executor.map(lambda args: enrich(*args, enriched), zip(rows, company_urls)):
+            print(row)
+            csv_output.writerow(row)
+            f_output.flush()
+    os.replace(partial_file, output_file)
 
 main()
@@ -0,0 +1,114 @@
+"""
+Request coalescing for the Flask app. While a call for a key is in flight, any other caller
+with the same key attaches to it instead of starting its own, and gets the same result (or
+the same events, for streams) once it is ready. Nothing is cached after the call finishes.
+"""
+
+import threading
+
+
+class SingleFlight:
+    """
+    Runs at most one call, or one stream, per key at a time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._streams = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls fn, unless a call with the same key is already running, in which case this waits
+        for that call and shares its result
+        :param key: A hashable key identifying the work
+        :param fn: The function to call
+        :return: the return value of fn, or raises the exception it raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if leader:
+            try:
+                call.result = fn(*args, **kwargs)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stream(self, key, fn, *args, **kwargs):
+        """
+        Iterates over the generator returned by fn in a background thread, unless a stream with
+        the same key is already running, and returns an iterator over its items. Every
+        subscriber sees every item, including the ones produced before it attached.
+        :param key: A hashable key identifying the work
+        :param fn: A function returning the generator to share
+        :return: an iterator over the items of the shared generator
+        """
+        with self._lock:
+            shared = self._streams.get(key)
+            if shared is None:
+                shared = self._streams[key] = _SharedStream()
+                thread = threading.Thread(target=self._produce, args=(key, shared, fn, args, kwargs),
+                                          daemon=True)
+                thread.start()
+        return iter(shared)
+
+    def _produce(self, key, shared, fn, args, kwargs):
+        """
+        Runs a shared stream to the end, then lets the next request for its key start afresh
+        :return: None
+        """
+        try:
+            for item in fn(*args, **kwargs):
+                shared.append(item)
+        finally:
+            with self._lock:
+                del self._streams[key]
+            shared.finish()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _SharedStream:
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._items = []
+        self._finished = False
+
+    def append(self, item):
+        with self._condition:
+            self._items.append(item)
+            self._condition.notify_all()
+
+    def finish(self):
+        with self._condition:
+            self._finished = True
+            self._condition.notify_all()
+
+    def __iter__(self):
+        index = 0
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: index < len(self._items) or self._finished)
+                if index >= len(self._items):
+                    return
+                item = self._items[index]
+            index += 1
+            yield item
@@ -0,0 +1,336 @@
+"""
+A faster layout engine for the WordCloud library. FastWordCloud takes exactly the same
+configuration as WordCloud (and can be used anywhere a WordCloud is), but searches for free
+space on the occupancy map with vectorized NumPy operations, caches the rasterized glyph
+masks per (word, font size, orientation), and can warm-start from a previous layout, putting
+every word that still fits back where it was before searching for places for the rest.
+"""
+
+from operator import itemgetter
+from random import Random
+import threading
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from wordcloud import WordCloud
+
+# Fonts and rasterized glyphs are shared by every FastWordCloud, so they carry over from one
+# render to the next even though each render builds a new instance. Glyphs are keyed by
+# (font_path, margin, word, font size, orientation), and the glyph cache is emptied once it
+# holds glyph_cache_size of them.
+glyph_cache_size = 20000
+_fonts = {}
+_glyphs = {}
+_cache_lock = threading.Lock()
+
+
+class FastWordCloud(WordCloud):
+    """
+    Drop-in replacement for WordCloud with a vectorized placement search.
+    :param warm_start: If True, each call to generate reuses the positions of the previous
+        layout_ (which can also be assigned before generating) wherever the word still fits.
+    All other arguments are passed through to WordCloud.
+    """
+
+    def __init__(self, *args, warm_start=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.warm_start = warm_start
+
+    def _get_font(self, font_size, orientation):
+        """
+        Loads a (possibly rotated) font once per size and orientation.
+        :param font_size: The font size in pixels
+        :param orientation: None or Image.ROTATE_90
+        :return: an ImageFont.TransposedFont
+        """
+        key = (self.font_path, font_size, orientation)
+        with _cache_lock:
+            font = _fonts.get(key)
+        if font is None:
+            font = ImageFont.TransposedFont(ImageFont.truetype(self.font_path, font_size),
+                                            orientation=orientation)
+            with _cache_lock:
+                font = _fonts.setdefault(key, font)
+        return font
+
+    def _get_glyph(self, word, font_size, orientation):
+        """
+        Rasterizes a word the same way WordCloud draws it, and caches the result.
+        :param word: The word to rasterize
+        :param font_size: The font size in pixels
+        :param orientation: None or Image.ROTATE_90
+        :return:
+            box: the (height, width) of the box that has to be free, including the margin
+            mask: a boolean array of the pixels covered by the word, relative to the box
+        """
+        key = (self.font_path, self.margin, word, font_size, orientation)
+        with _cache_lock:
+            glyph = _glyphs.get(key)
+        if glyph is not None:
+            return glyph
+
+        font = self._get_font(font_size, orientation)
+        offset = self.margin // 2
+        scratch = ImageDraw.Draw(Image.new("L", (1, 1)))
+        box_size = scratch.textbbox((0, 0), word, font=font, anchor="lt")
+        ink = scratch.textbbox((offset, offset), word, font=font)
+        box = (box_size[3] + self.margin, box_size[2] + self.margin)
+
+        img = Image.new("L", (max(box[1], ink[2], 1), max(box[0], ink[3], 1)))
+        ImageDraw.Draw(img).text((offset, offset), word, fill="white", font=font)
+        mask = np.asarray(img) > 0
+        # the cached masks are shared, so make sure nothing can write to one by accident
+        mask.flags.writeable = False
+        glyph = (box, mask)
+
+        with _cache_lock:
+            if len(_glyphs) >= glyph_cache_size:
+                _glyphs.clear()
+            _glyphs[key] = glyph
+        return glyph
+
+    def generate_from_frequencies(self, frequencies, max_font_size=None):
+        """
+        Create a word_cloud from words and frequencies, following the same font sizing and
+        orientation rules as WordCloud.generate_from_frequencies.
+        :param frequencies: A dictionary from words to their frequency
+        :param max_font_size: Use this font-size instead of self.max_font_size
+        :return: self
+        """
+        if self.repeat:
+            return super().generate_from_frequencies(frequencies, max_font_size=max_font_size)
+
+        frequencies = sorted(frequencies.items(), key=itemgetter(1), reverse=True)
+        if len(frequencies) <= 0:
+            raise ValueError("We need at least 1 word to plot a word cloud, "
+                             "got %d." % len(frequencies))
+        frequencies = frequencies[:self.max_words]
+
+        max_frequency = float(frequencies[0][1])
+        frequencies = [(word, freq / max_frequency) for word, freq in frequencies]
+
+        previous = {}
+        if self.warm_start and getattr(self, 'layout_', None):
+            for (word, freq), font_size, position, orientation, color in self.layout_:
+                previous[word] = (freq, font_size, position, orientation, color)
+
+        if self.random_state is not None:
+            random_state = self.random_state
+        else:
+            random_state = Random()
+
+        if self.mask is not None:
+            occupied = self._get_bolean_mask(self.mask).astype(bool)
+        else:
+            occupied = np.zeros((self.height, self.width), dtype=bool)
+        height, width = occupied.shape
+        integral = np.zeros((height + 1, width + 1), dtype=np.int32)
+        integral[1:, 1:] = occupied.cumsum(axis=0).cumsum(axis=1)
+
+        if max_font_size is None:
+            max_font_size = self.max_font_size
+
+        if max_font_size is None:
+            if len(frequencies) == 1:
+                font_size = self.height
+            else:
+                warm_start, self.warm_start = self.warm_start, False
+                self.generate_from_frequencies(dict(frequencies[:2]), max_font_size=self.height)
+                self.warm_start = warm_start
+                sizes = [x[1] for x in self.layout_]
+                if len(sizes) == 0:
+                    raise ValueError("Couldn't find space to draw. Either the Canvas size"
+                                     " is too small or too much of the image is masked out.")
+                if len(sizes) == 1:
+                    font_size = sizes[0]
+                else:
+                    font_size = int(2 * sizes[0] * sizes[1] / (sizes[0] + sizes[1]))
+        else:
+            font_size = max_font_size
+
+        self.words_ = dict(frequencies)
+
+        # every box that could not be placed; the canvas only fills up, so any box at
+        # least as tall and as wide as one of these will not fit either
+        failed = []
+        placed = {}
+        # with a previous layout, every word that still fits in its old spot goes back there
+        # first, and only then are the others searched for, so that a word that moved cannot
+        # take the spot of a word further down the list
+        pending = []
+        last_freq = 1.
+
+        for index, (word, freq) in enumerate(frequencies):
+            if freq == 0:
+                continue
+            rs = self.relative_scaling
+            if rs != 0:
+                font_size = int(round((rs * (freq / float(last_freq)) + (1 - rs)) * font_size))
+            if random_state.random() < self.prefer_horizontal:
+                orientation = None
+            else:
+                orientation = Image.ROTATE_90
+
+            if previous:
+                last_freq = freq
+                kept = self._keep_position(integral, word, freq, font_size, previous.get(word))
+                if kept is None:
+                    pending.append((index, word, font_size, orientation))
+                    continue
+                kept_size, result, orientation, mask, color = kept
+                placed[index] = self._place(occupied, integral, word, kept_size, result, orientation, mask,
+                                            color, random_state)
+                continue
+
+            result, font_size, orientation, mask = self._search(integral, word, font_size, orientation,
+                                                                failed, random_state)
+            if result is None:
+                break
+            last_freq = freq
+            placed[index] = self._place(occupied, integral, word, font_size, result, orientation, mask,
+                                        None, random_state)
+
+        # as in a fresh layout, once a word had to shrink the words after it start no bigger
+        largest = None
+        for index, word, font_size, orientation in pending:
+            if largest is not None:
+                font_size = min(font_size, largest)
+            result, largest, orientation, mask = self._search(integral, word, font_size, orientation,
+                                                              failed, random_state)
+            if result is None:
+                break
+            placed[index] = self._place(occupied, integral, word, largest, result, orientation, mask,
+                                        None, random_state)
+
+        self.layout_ = [(frequencies[index],) + placed[index] for index in sorted(placed)]
+        return self
+
+    def _keep_position(self, integral, word, freq, font_size, previous):
+        """
+        Tries to put a word back where it was in the previous layout, at its new font size and
+        in either orientation. Failing that, a word whose frequency rose by at most 10% can keep
+        its old, smaller font size, which is usually what it had to shrink to last time.
+        :param integral: The integral image of the occupancy map
+        :param word: The word to place
+        :param freq: The word's normalized frequency in this layout
+        :param font_size: The word's font size in this layout
+        :param previous: The word's (frequency, font size, position, orientation, color) in the
+            previous layout, or None
+        :return: the (font size, box position, orientation, glyph mask, color), or None if it
+            doesn't fit
+        """
+        if previous is None:
+            return None
+        old_freq, old_size, position, old_orientation, color = previous
+        x = position[0] - self.margin // 2
+        y = position[1] - self.margin // 2
+        sizes = [font_size]
+        if old_size < font_size and freq <= 1.1 * old_freq:
+            sizes.append(old_size)
+        other_orientation = Image.ROTATE_90 if old_orientation is None else None
+        for size in sizes:
+            for orientation in (old_orientation, other_orientation):
+                box, mask = self._get_glyph(word, size, orientation)
+                if self._is_free(integral, x, y, box):
+                    return size, (x, y), orientation, mask, color
+        return None
+
+    def _search(self, integral, word, font_size, orientation, failed, random_state):
+        """
+        Finds a random free spot for a word, rotating it and then shrinking it until it fits,
+        the same way WordCloud does.
+        :param integral: The integral image of the occupancy map
+        :param word: The word to place
+        :param font_size: The font size to start from
+        :param orientation: The orientation to start from
+        :param failed: The boxes that did not fit so far, extended with any new ones
+        :param random_state: The Random instance used by the layout
+        :return: the (box position, font size, orientation, glyph mask), with a position of
+            None if the word went below min_font_size
+        """
+        tried_other_orientation = False
+        while font_size >= self.min_font_size:
+            box, mask = self._get_glyph(word, font_size, orientation)
+            if not any(box[0] >= h and box[1] >= w for h, w in failed):
+                result = self._sample_position(integral, box, random_state)
+                if result is not None:
+                    return result, font_size, orientation, mask
+                failed.append(box)
+            if not tried_other_orientation and self.prefer_horizontal < 1:
+                orientation = None if orientation == Image.ROTATE_90 else Image.ROTATE_90
+                tried_other_orientation = True
+            else:
+                font_size -= self.font_step
+                orientation = None
+        return None, font_size, orientation, None
+
+    def _place(self, occupied, integral, word, font_size, result, orientation, mask, color, random_state):
+        """
+        Marks a word's spot as occupied and builds its layout_ entry.
+        :param color: The word's color, or None to pick one with color_func
+        :return: the (font size, position, orientation, color) of the word
+        """
+        self._occupy(occupied, integral, result, mask)
+        x, y = result[0] + self.margin // 2, result[1] + self.margin // 2
+        if color is None:
+            color = self.color_func(word, font_size=font_size, position=(x, y),
+                                    orientation=orientation, random_state=random_state,
+                                    font_path=self.font_path)
+        return font_size, (x, y), orientation, color
+
+    @staticmethod
+    def _is_free(integral, x, y, box):
+        """
+        Checks whether a box is inside the canvas and not yet occupied.
+        :param integral: The integral image of the occupancy map
+        :param x: The row of the top left corner of the box
+        :param y: The column of the top left corner of the box
+        :param box: The (height, width) of the box
+        :return: True if the box can be placed at (x, y)
+        """
+        h, w = box
+        if x < 0 or y < 0 or x + h >= integral.shape[0] or y + w >= integral.shape[1]:
+            return False
+        return (integral[x + h, y + w] - integral[x, y + w]
+                - integral[x + h, y] + integral[x, y]) == 0
+
+    @staticmethod
+    def _sample_position(integral, box, random_state):
+        """
+        Finds every free position for a box at once and picks one of them at random.
+        :param integral: The integral image of the occupancy map
+        :param box: The (height, width) of the box
+        :param random_state: The Random instance used by the layout
+        :return: The (row, column) of the top left corner, or None if the box fits nowhere
+        """
+        h, w = box
+        if h >= integral.shape[0] or w >= integral.shape[1]:
+            return None
+        area = (integral[h:, w:] - integral[:-h, w:]
+                - integral[h:, :-w] + integral[:-h, :-w])
+        free = np.flatnonzero(area == 0)
+        if len(free) == 0:
+            return None
+        return divmod(int(free[random_state.randint(0, len(free) - 1)]), area.shape[1])
+
+    @staticmethod
+    def _occupy(occupied, integral, position, mask):
+        """
+        Marks the pixels of a placed word as occupied and adds them to the integral image.
+        Only the part below and to the right of the word changes, and outside of the word's
+        own rows and columns it changes by a constant per row, column or overall.
+        :param occupied: The boolean occupancy map
+        :param integral: The integral image of the occupancy map
+        :param position: The (row, column) of the top left corner of the word's box
+        :param mask: The glyph mask of the word
+        :return: None
+        """
+        x, y = position
+        h = min(mask.shape[0], occupied.shape[0] - x)
+        w = min(mask.shape[1], occupied.shape[1] - y)
+        added = mask[:h, :w] & ~occupied[x:x + h, y:y + w]
+        occupied[x:x + h, y:y + w] |= added
+        added = added.cumsum(axis=0, dtype=np.int32).cumsum(axis=1)
+        integral[x + 1:x + h + 1, y + 1:y + w + 1] += added
+        integral[x + 1:x + h + 1, y + w + 1:] += added[:, -1:]
+        integral[x + h + 1:, y + 1:y + w + 1] += added[-1:, :]
+        integral[x + h + 1:, y + w + 1:] += added[-1, -1]
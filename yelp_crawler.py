@@ -12,6 +12,8 @@ import urllib.request, urllib.parse, urllib.error
 from bs4 import BeautifulSoup
 import ssl
 from wordcloud import WordCloud, STOPWORDS
+from wordcloud_layout import FastWordCloud
+from review_extractor import extract_reviews
 
 default_url = 'https://www.yelp.com/search?find_desc=Restaurants&find_loc='
 ctx = ssl.create_default_context()
@@ -108,17 +110,10 @@ def get_reviews(restaurant_links, restaurant_names, num_reviews):
 
     for i in range(num_reviews):
         print(f"Gathering top reviews on {restaurant_names[i]} now...")
-        review_text = []
         url = restaurant_links[i]
         uh = urllib.request.urlopen(url, context=ctx)
         html = uh.read()
-        soup = BeautifulSoup(html, 'html.parser')
-
-        for p in soup.find_all('p'):
-            if 'itemprop' in p.attrs:
-                if p.attrs['itemprop'] == 'description':
-                    text = p.get_text().strip()
-                    review_text.append(text)
+        review_text = [review.text for review in extract_reviews(html)]
 
         reviews[str(restaurant_names[i])] = review_text
 
@@ -340,7 +335,7 @@ def wordcloud_from_city(review_dict, place=None,num_restaurant=10,num_reviews=20
         for word in stopword_list:
             stopwords.add(word)
 
-    wc = WordCloud(background_color="white", max_words=50, stopwords=stopwords, max_font_size=40, scale=3)
+    wc = FastWordCloud(background_color="white", max_words=50, stopwords=stopwords, max_font_size=40, scale=3)
     _ = wc.generate(text)
 
     plot_wc(wc, place=place)